@@ -1,8 +1,13 @@
 import requests
-import json
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 
+from .Utils import create_session, post_with_retry
+
+MAX_WORKERS = 2
+CSV_CHUNKSIZE = 50_000
+
 def parameters_for_search(access_token_key: str, after:int = 0, ):
     """
     Description: 
@@ -16,7 +21,7 @@ def parameters_for_search(access_token_key: str, after:int = 0, ):
 
     Returns:
         - url: String containing the url for the api call.
-        - headers: Dictionary containing the Content-Type and Authorization parameters for the call, with the access token key embeded accordingly.
+        - headers: Dictionary containing the Authorization parameter for the call, with the access token key embeded accordingly, the Content-Type is set by requests when sending the payload as json.
         - payload: Dictionary with lists in a json like format, this include the filters of the call, properties, limit and after parameter, all formatted as needed for the search api.
         
     Notes:
@@ -24,7 +29,7 @@ def parameters_for_search(access_token_key: str, after:int = 0, ):
         -  The url could be changed according to the objects needed, same with the filters and properties and could even be changed to be parameters but I felt it would affect the readability. 
     """
     url = 'https://api.hubapi.com/crm/v3/objects/contacts/search'
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {access_token_key}"}
+    headers = {"Authorization": f"Bearer {access_token_key}"}
     payload = {
         "filters": [
             {
@@ -49,11 +54,32 @@ def parameters_for_search(access_token_key: str, after:int = 0, ):
     }
     return url, headers, payload
 
+def search_page(access_token_key: str, after: int = 0, session: requests.Session = None) -> Dict:
+    """
+    Description: Make a single post request on the search api for contacts, skipping the given number of results.
+
+    Arguments:
+        - access_token_key: Access token, needed for authentication.
+        - after: Indicates to the requests how many items should be skipped before showing the results, 0 by default to get the first page.
+        - session: The session used to make the request, if it isn't given a new connection is opened for the request.
+
+    Returns:
+        - data: The response of the api, with the total number of results that meet the filters and the contacts on that page, in a List[Dict[str:str]] structure, under results.
+
+    Notes:
+        - The search api has a low limit of requests per second, so the request is retried with post_with_retry when that limit is reached.
+        - If the api still answers with an error, an HTTPError is raised instead of saving an incomplete extraction.
+    """
+    url, headers, payload = parameters_for_search(access_token_key, after = after)
+    res = post_with_retry(session, url, headers, payload)
+    res.raise_for_status()
+    return res.json()
+
 def contact_collection(access_token_key: str, filename: str) -> str: 
     """
     Description: Make a post request on the search api for contacts, using the default values of parameters_for_search which gives the total number of results that meet the filters, using
-    this value, calls are made, changing the "after" parameter until all results are fetched and saved on the variable contacts which has a List[Dict[str:str]] structure, finally the 
-    function create_df_and_save_to_csv is called to save a csv with the data and return the name or path of said file. 
+    this value, calls are made, changing the "after" parameter until all results are fetched, each page is converted into a dataframe as soon as it's fetched and saved on the
+    list frames, finally the frames are concatenated and the function save_df_to_file is called to save a csv with the data and return the name or path of said file. 
 
     Arguments:
         - access_token_key: Access token, needed for authentication.
@@ -64,30 +90,72 @@ def contact_collection(access_token_key: str, filename: str) -> str:
     
     Notes:
         - The max_per_page variable could be changed if the maximum number of supported objects per page is increased by the api itself
+        - Since the first call gives the total, the rest of the pages are requested concurrently by MAX_WORKERS threads, so the next request is already waiting
+         for the api while the previous one is being parsed, the pages are still saved in order.
+        - All of the requests share a single session with a connection for each thread, so the connections are reused instead of opening a new one for every page.
+        - Converting each page right away means only small dataframes are kept instead of the json like structure of every contact, which takes a lot more memory.
     """
     max_per_page = 100 
-    url, headers, payload =  parameters_for_search(access_token_key)
-
-    res = requests.post(url, headers=headers, data=json.dumps(payload)) 
+    session = create_session(MAX_WORKERS)
 
-    data = res.json()
+    data = search_page(access_token_key, session = session)
 
     total = data['total']
     
-    contacts = data['results']
+    frames = [create_df(data['results'])]
 
-    page = 1
+    afters = range(max_per_page, total, max_per_page)
 
-    while page * max_per_page < total:
-        url, headers, payload = parameters_for_search(access_token_key, after = page * max_per_page)
-        res = requests.post(url, headers = headers, data = json.dumps(payload))
-        contacts.extend(res.json()['results'])
-        page+=1
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        frames.extend(executor.map(lambda after: create_df(search_page(access_token_key, after, session)['results']), afters))
 
-    contacts_csv = create_df_and_save_to_csv(contacts, filename)
+    contacts_df = pd.concat(frames, ignore_index = True)
+
+    contacts_csv = save_df_to_file(contacts_df, filename)
 
     return contacts_csv 
 
+def create_df(contacts: List[Dict[str,str]]) -> pd.DataFrame:
+    """
+    Description: Takes data in a json like structure and converts it into a pandas dataframe.
+
+    Arguments:
+        - contacts: Json like structure, consisting in python of a list of dictionaries of str to str values.
+
+    Returns:
+        - contacts_df: Dataframe with a row for each contact.
+
+    Notes:
+        - The contacts only have one level of nesting, the properties, so the dataframe is built directly with them and the other fields of the contact instead of
+         using json_normalize, this way the columns don't have the "properties." prefix.
+    """
+    contacts_df = pd.DataFrame([{'id': contact['id'], 'createdAt': contact['createdAt'], 'updatedAt': contact['updatedAt'], 'archived': contact['archived'],
+                                 **contact['properties']} for contact in contacts])
+    return contacts_df
+
+def save_df_to_file(contacts_df: pd.DataFrame, filename: str) -> str:
+    """
+    Description: Saves a dataframe of contacts as a csv file, returning the name or path of said file.
+
+    Arguments:
+        - contacts_df: Dataframe with a row for each contact.
+        - filename: Name or path of the csv.
+
+    Returns:
+        - filename: String containing the name or path of the csv on which the data was saved.
+
+    Notes:
+        - If the filename ends with .parquet the data is saved as a parquet file instead, which is smaller, keeps the types of the columns and is faster to load
+         in the next steps.
+        - If the filename ends with .gz the csv is compressed with gzip, using a low compression level since it's much faster and the size is still reduced
+         several times, in any case the csv is written in chunks of CSV_CHUNKSIZE rows to limit the memory used.
+    """
+    if filename.endswith('.parquet'):
+        contacts_df.to_parquet(filename, index = False, compression = 'zstd')
+    else:
+        contacts_df.to_csv(filename, index = False, compression = {'method': 'infer', 'compresslevel': 3}, chunksize = CSV_CHUNKSIZE)
+    return filename
+
 def create_df_and_save_to_csv(contacts: List[Dict[str,str]], filename: str) -> str:
     """
     Description: Takes data in a json like structure, converts it into a pandas dataframe and saves it as a csv file, returning the name or path of said file.
@@ -99,6 +167,4 @@ def create_df_and_save_to_csv(contacts: List[Dict[str,str]], filename: str) -> s
     Returns:
         - filename: String containing the name or path of the csv on which the data was saved.
     """
-    contacts_df = pd.json_normalize(contacts)    
-    contacts_df.to_csv(filename, index = False)
-    return filename
+    return save_df_to_file(create_df(contacts), filename)
\ No newline at end of file
@@ -1,7 +1,26 @@
 import requests
-import json
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
+from typing import List, Dict
+
+from .Utils import create_session, post_with_retry
+
+MAX_WORKERS = 16
+BATCH_SIZE = 100
+
+# Only the columns sent to hubspot are read
+CONTACT_DTYPES = {
+    'firstname': 'string',
+    'lastname': 'string',
+    'email': 'string',
+    'country': 'category',
+    'city': 'category',
+    'phone': 'string',
+    'technical_test___create_date': 'string',
+    'industry': 'category',
+    'hs_object_id': 'int64'
+}
 
 def load_df_from_csv(filename: str) -> pd.DataFrame:
     """
@@ -16,12 +35,17 @@ def load_df_from_csv(filename: str) -> pd.DataFrame:
 
     Notes:
         - This is intended for the csv with processed data so no processing is required
+        - Only the columns in CONTACT_DTYPES are read and with those types.
+        - If the filename ends with .parquet it's loaded as a parquet file instead.
     """
-    df = pd.read_csv(filename)
+    if filename.endswith('.parquet'):
+        df = pd.read_parquet(filename, columns=list(CONTACT_DTYPES)).astype(CONTACT_DTYPES)
+    else:
+        df = pd.read_csv(filename, dtype=CONTACT_DTYPES, usecols=list(CONTACT_DTYPES))
     return df
 
 def create_contact(firstname: str, lastname: str, email: str, country: str, city: str, phone: str, original_create_date: str, original_industry: str, temporary_id: str,
-                    access_token_key: str) -> None:
+                    access_token_key: str, session: requests.Session = None) -> None:
     """
     Description:
         Set a contact in HubSpot CRM using the provided information.
@@ -37,6 +61,7 @@ def create_contact(firstname: str, lastname: str, email: str, country: str, city
         - original_industry: string of a single industry or multiple industries concatenated with a ; including one before the first industry, eg ";Milk;Fish...".
         - temporary_id: hs_object_id.
         - access_token_key: The access token key for authentication.
+        - session: The session used to make the request, if it isn't given a new connection is opened for the request.
 
     Returns:
         - None
@@ -49,7 +74,7 @@ def create_contact(firstname: str, lastname: str, email: str, country: str, city
     """
 
     url = 'https://api.hubapi.com/crm/v3/objects/contacts'
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {access_token_key}"}
+    headers = {"Authorization": f"Bearer {access_token_key}"}
     payload = {
                 "properties": {
                 "firstname" : firstname,
@@ -64,7 +89,38 @@ def create_contact(firstname: str, lastname: str, email: str, country: str, city
                 }
             }
     
-    requests.post(url, headers=headers, data=json.dumps(payload))
+    post_with_retry(session, url, headers, payload)
+
+def create_contacts_batch(contacts: List[Dict[str,str]], access_token_key: str, session: requests.Session = None) -> None:
+    """
+    Description:
+        Set several contacts in HubSpot CRM with a single request to the batch api.
+
+    Arguments:
+        - contacts: List of dictionaries with the properties of each contact, with the same keys and rules as the payload of create_contact.
+        - access_token_key: The access token key for authentication.
+        - session: The session used to make the request, if it isn't given a new connection is opened for the request.
+
+    Returns:
+        - None
+
+    Notes:
+        - The api accepts at most BATCH_SIZE contacts per request.
+        - If any of the contacts has an invalid value the whole batch results in an error.
+        - Errors are printed with the temporary ids of the batch instead of raised, so a failed batch doesn't stop the other ones from being loaded.
+    """
+    url = 'https://api.hubapi.com/crm/v3/objects/contacts/batch/create'
+    headers = {"Authorization": f"Bearer {access_token_key}"}
+    payload = {"inputs": [{"properties": properties} for properties in contacts]}
+
+    ids = f"{contacts[0]['temporary_id']} to {contacts[-1]['temporary_id']}"
+    try:
+        res = post_with_retry(session, url, headers, payload)
+    except requests.RequestException as error:
+        print(f"The batch with the contacts {ids} couldn't be sent: {error}")
+        return
+    if res.status_code >= 400:
+        print(f"The batch with the contacts {ids} failed with status {res.status_code}: {res.text}")
 
 def load_into_hubspot(access_token_key: str, filename: str) -> None:  
     """
@@ -76,7 +132,29 @@ def load_into_hubspot(access_token_key: str, filename: str) -> None:
 
     Returns:
         - None
+
+    Notes:
+        - The contacts are created in batches of BATCH_SIZE with the batch api, so a request is made for every BATCH_SIZE contacts instead of every contact.
+        - The batches are sent concurrently by MAX_WORKERS threads sharing a single session, since most of the time is spent waiting for the api to respond.
+        - Missing values are sent as null, since NaN can't be converted to json.
     """
     df = load_df_from_csv(filename)
-    df.apply(lambda x: create_contact(x['firstname'], x['lastname'], x['email'], x['country'], x['city'], x['phone'], x['technical_test___create_date'], x['industry'],
-                                      str(x['hs_object_id']), access_token_key), axis=1)
\ No newline at end of file
+    session = create_session()
+
+    contacts = pd.DataFrame({
+        "firstname" : df['firstname'],
+        "lastname" : df['lastname'],
+        "email" : df['email'],
+        "country" : df['country'],
+        "city" : df['city'],
+        "phone" : df['phone'],
+        "original_create_date" : df['technical_test___create_date'],
+        "original_industry" : df['industry'],
+        "temporary_id" : df['hs_object_id'].astype(str)
+    })
+    contacts = contacts.astype(object).where(contacts.notna(), None).to_dict('records')
+
+    batches = [contacts[i:i + BATCH_SIZE] for i in range(0, len(contacts), BATCH_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(lambda batch: create_contacts_batch(batch, access_token_key, session), batches))
\ No newline at end of file
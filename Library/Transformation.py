@@ -1,25 +1,67 @@
 import pandas as pd
+import numpy as np
 import re
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
 
 #from geopy.geocoders import Nominatim
 #import phonenumbers
 #import country_converter as coco
 
+# Only the columns used by the transformations and the load are read, countries and industries have few distinct values so they're saved as categories
+RAW_CONTACT_DTYPES = {
+    'createdAt': 'string',
+    'country': 'category',
+    'firstname': 'string',
+    'hs_object_id': 'int64',
+    'industry': 'category',
+    'lastname': 'string',
+    'phone': 'string',
+    'raw_email': 'string',
+    'technical_test___create_date': 'string'
+}
+
+# The patterns are compiled once here instead of on every call
+EMAIL_RE = re.compile(r'<(.*)>')
+NAME_RE = re.compile(r'([a-z]+)_([a-z]+)')
+NONDIGIT_RE = re.compile(r'\D')
+
 def load_df_from_csv(filename: str) -> pd.DataFrame:
     """
-    Description: Loads a csv file as a pandas dataframe, transforms the name of it's columns, eliminating "properties." from them and returns the dataframe.
+    Description: Loads a csv file as a pandas dataframe and returns it.
 
     Arguments:
         - filename: Name or path of the csv.
 
     Returns:
-        - df: Dataframe made from the csv data and with some of it's column names modified.
+        - df: Dataframe made from the csv data.
+
+    Notes:
+        - Only the columns in RAW_CONTACT_DTYPES are read and with those types, so pandas doesn't need to infer them.
+        - If the filename ends with .parquet it's loaded as a parquet file instead.
     """
-    df=pd.read_csv(filename)
-    df.columns = df.columns.str.replace('properties.','')
+    if filename.endswith('.parquet'):
+        df=pd.read_parquet(filename, columns=list(RAW_CONTACT_DTYPES)).astype(RAW_CONTACT_DTYPES)
+    else:
+        df=pd.read_csv(filename, dtype=RAW_CONTACT_DTYPES, usecols=list(RAW_CONTACT_DTYPES))
     return df
 
+def save_df_to_file(df: pd.DataFrame, filename: str) -> str:
+    """
+    Description: Saves the transformed dataframe as a csv file, or as a parquet file if the filename ends with .parquet, and returns the name or path of said file.
+
+    Arguments:
+        - df: The DataFrame containing the transformed data.
+        - filename: Name or path of the file.
+
+    Returns:
+        - filename: String containing the name or path of the file on which the data was saved.
+    """
+    if filename.endswith('.parquet'):
+        df.to_parquet(filename, index = False, compression = 'zstd')
+    else:
+        df.to_csv(filename, index = False, mode = 'w')
+    return filename
+
 """My initial solution for this problem used the geolocation library and can be seen at the end of this file, it's more robust, using the library to get any country but a lot slower
 due to the api calls used, it could be efficient by writing on a file the results as they're searched and only using the api for the ones that haven't been searched yet but I feel like 
 this would go against the intentions of the test so I didn't implement it."""
@@ -36,6 +78,9 @@ def load_country_city_database() -> Dict[str, List]:
     locations = {'England': ['Plymouth','Milton Keynes','Oxford','London','Winchester'], 'Ireland': ['Waterford','Limerick','Dublin','Cork']}
     return locations
 
+COUNTRIES = set(load_country_city_database())
+CITY_TO_COUNTRY = {city.lower(): country for country, cities in load_country_city_database().items() for city in cities}
+
 def country_recognition(place: str) -> Tuple[str, str]:
     """
    Description: Recognize the country associated with a given place using a database of known country city relationships.
@@ -71,35 +116,36 @@ def country_recognition(place: str) -> Tuple[str, str]:
     else:
         return ("Unknown","Not recognized")
     
-def split_column_of_tuples(df: pd.DataFrame, old_column: str, new_column_1: str, new_column_2: str) -> pd.DataFrame:
+def country_recognition_vectorized(places: pd.Series) -> Tuple[pd.Series, pd.Series]:
     """
-    Description: Split a column containing tuples into two separate columns. 
+    Description: Recognize the countries associated with all of the places at once using a lookup from each city to it's country.
 
     Arguments:
-        - df: The DataFrame containing the data.
-        - old_column: The name of the column to be split.
-        - new_column_1: The name of the first new column.
-        - new_column_2: The name of the second new column.
+        - places: The names of the places to be recognized, either cities or countries.
 
     Returns:
-        - df: The updated DataFrame with the new columns.
+        - Tuple[pd.Series, pd.Series]: The recognized countries and the cities as categories, with the same index as places.
 
     Notes:
-        - It's main use is to split the city_country column and it's done mainly for the management of null values.
-        - If a tuple is missing a value, the corresponding new column will contain an empty string ('').
+        - It follows the same rules as country_recognition but works on whole columns instead of calling a function for every row, and since the countries
+         and cities are returned separately there's no need to split a column of tuples afterwards.
+        - There are only a few countries and cities so they're returned as categories, which take less memory and are faster to compare and group.
     """
-    df[[new_column_1, new_column_2]] = df[old_column].apply(lambda x: pd.Series(x))
-    df[new_column_2].fillna('', inplace=True) 
-    return df
+    city_countries = places.str.lower().map(CITY_TO_COUNTRY)
+    is_missing, is_country, is_city = places.isna(), places.isin(COUNTRIES), city_countries.notna()
+
+    countries = np.select([is_missing, is_country, is_city], ["Nan", places, city_countries], default="Unknown")
+    cities = np.select([is_missing, is_country, is_city], ["Nan", "Unknown", places], default="Not recognized")
+    return pd.Series(countries, index=places.index, dtype='category'), pd.Series(cities, index=places.index, dtype='category')
 
-def found_emails(raw_email: str, pattern: str = '<(.*)>') -> str:      
+def found_emails(raw_email: str, pattern: Union[str, re.Pattern] = EMAIL_RE) -> str:      
     """
     Description: Extracts an email address from a raw email string using a pattern.
 
     Arguments:
         - raw_email: The raw email string from which to extract the email address. It follows the pattern "any characters <(email)> any characters".
-        - pattern: The regular expression pattern used to match and extract the email address. 
-                   Default is '<(.*)>'.
+        - pattern: The regular expression pattern used to match and extract the email address, as a string or already compiled. 
+                   Default is EMAIL_RE, '<(.*)>'.
 
     Returns:
         - The extracted email address as a string.
@@ -114,17 +160,46 @@ def found_emails(raw_email: str, pattern: str = '<(.*)>') -> str:
     if pd.isnull(raw_email):
         return ""
     else:
-        try:
-            email = re.search(pattern, raw_email)
-            return email.group(1)
-        except AttributeError:
+        # Only strings are compiled, the compiled patterns are used directly so the re cache isn't looked up on every call
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        email = pattern.search(raw_email)
+        if email is None:
             print ('Incorrect pattern, returning input')
             return raw_email
-        
+        return email.group(1)
+
+def found_emails_vectorized(raw_emails: pd.Series, pattern: Union[str, re.Pattern] = EMAIL_RE) -> pd.Series:
+    """
+    Description: Extracts all of the email addresses at once from the raw email strings using a pattern.
+
+    Arguments:
+        - raw_emails: The raw email strings from which to extract the email addresses.
+        - pattern: The regular expression pattern used to match and extract the email address, as a string or already compiled, with a single capturing group.
+                   Default is EMAIL_RE, '<(.*)>'.
+
+    Returns:
+        - pd.Series: The extracted email addresses.
+
+    Notes:
+        - It follows the same rules as found_emails but works on whole columns instead of calling a function for every row, so
+          the message for an incorrect pattern is printed only once.
+    """
+    emails = raw_emails.str.extract(pattern, expand=False)
+
+    not_matched = emails.isna() & raw_emails.notna()
+    if not_matched.any():
+        print ('Incorrect pattern, returning input')
+
+    return emails.where(~not_matched, raw_emails).fillna("")
+
 """
 In a similar fashion to the country recognition function, my first solution used the library phonenumbers and country_converter but it was slow,
 I also added it at the end of the file and the use of a file, as explained in the country recognition function would make it efficient by saving the results as they're found.
 """
+GREAT_BRITAIN_COUNTRIES = {'England': 'Great Britain', 'Wales': 'Great Britain', 'Northern Ireland': 'Great Britain', 'Scotland': 'Great Britain'}
+COUNTRY_CODES = {'Great Britain': '+44', 'Ireland': '+353'}
+
 def country_codes_database(country: str) -> str:
     """
     Description: Returns a database of countries and it's phone codes.
@@ -135,12 +210,9 @@ def country_codes_database(country: str) -> str:
     Notes:
         - A bigger and more robust could be built using the libraries I mentioned before.
         - If the country isn't found, an empty string is returned
+        - The database is the COUNTRY_CODES constant so it isn't built again on every call.
     """  
-    codes = {'Great Britain': '+44', 'Ireland': '+353'}
-    if country in codes.keys():
-        return codes[country]
-    else:
-        return ""
+    return COUNTRY_CODES.get(country, "")
 
 def fix_phone_numbers(raw_phone: str, country: str) -> str: 
     """
@@ -164,24 +236,42 @@ def fix_phone_numbers(raw_phone: str, country: str) -> str:
     if  pd.isnull(raw_phone):
         return "Nan"
     else:
-        country = country
-        if country in ['England', 'Wales', 'Northern Ireland', 'Scotland']:
-            country = 'Great Britain'
+        country = GREAT_BRITAIN_COUNTRIES.get(country, country)
  
         phone_code = country_codes_database(country)
         
-        raw_phone = re.sub('\D', '', raw_phone)
+        raw_phone = NONDIGIT_RE.sub('', raw_phone)
         phone_numbers = raw_phone.lstrip('0')
         phone = f"({phone_code}) " + phone_numbers[:4] + " " + phone_numbers[4:] 
         return phone
 
-def name_from_email(email: str, pattern: str = '([a-z]+)_([a-z]+)') -> str: 
+def fix_phone_numbers_vectorized(raw_phones: pd.Series, countries: pd.Series) -> pd.Series:
+    """
+    Description: Formats all of the raw phone numbers at once based on their countries.
+
+    Arguments:
+        - raw_phones: The raw phone numbers to be formatted.
+        - countries: The countries associated with the phone numbers, with the same index as raw_phones.
+
+    Returns:
+        - pd.Series: The formatted phone numbers.
+
+    Notes:
+        - It follows the same rules as fix_phone_numbers but works on whole columns instead of calling a function for every row.
+    """
+    phone_codes = countries.astype(object).replace(GREAT_BRITAIN_COUNTRIES).map(COUNTRY_CODES).fillna("")
+
+    phone_numbers = raw_phones.str.replace(NONDIGIT_RE, '', regex=True).str.lstrip('0')
+    phones = "(" + phone_codes + ") " + phone_numbers.str[:4] + " " + phone_numbers.str[4:]
+    return phones.where(raw_phones.notna(), "Nan")
+
+def name_from_email(email: str, pattern: Union[str, re.Pattern] = NAME_RE) -> str: 
     """
     Description: Extracts the full name from an email using a pattern.
 
     Arguments:
         - email: The email string from which to extract the name. It follows the pattern "any characters <firstname_lastnameNumbers@emailDomain> any characters"
-        - pattern: The regex pattern to match and extract the name. Defaults to '([a-z]+)_([a-z]+)'.
+        - pattern: The regex pattern to match and extract the name, as a string or already compiled. Defaults to NAME_RE, '([a-z]+)_([a-z]+)'.
 
     Returns:
         - The extracted full name as a string capitalized.
@@ -190,7 +280,9 @@ def name_from_email(email: str, pattern: str = '([a-z]+)_([a-z]+)') -> str:
         - The function assumes that the name can be identified from the email using the specified pattern, if it isn't this functions shouldn't be used.
         - The pattern should contain two capturing groups to extract the first and last name.
     """
-    name = re.search(pattern, email)
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    name = pattern.search(email)
     return name.group(1).capitalize() + " " + name.group(2).capitalize()
 
 def generate_name(row: pd.Series) -> str:
@@ -221,35 +313,31 @@ def generate_name(row: pd.Series) -> str:
     else:
         return row['firstname'] + " " + row['lastname']
 
-def concat_industries(df: pd.DataFrame, values: List) -> List[int]:
+def generate_name_vectorized(df: pd.DataFrame, pattern: Union[str, re.Pattern] = NAME_RE) -> pd.Series:
     """
     Description:
-        Concatenate all of the industries that a person has had with a semicolon and updating the value of the most recent record of each contact, 
-        finally returns the index of these recent records.
+        Generate the names of all of the records at once from the first name and last name columns, or the raw email column.
 
     Arguments:
-        - df: The DataFrame containing the data.
-        - values: A list of tuples representing the latest record's index and the industry values that that contact has had over time.
+        - df: The DataFrame containing the relevant columns (firstname, lastname, raw_email).
+        - pattern: The regex pattern to match and extract the name from the email, as a string or already compiled. Defaults to NAME_RE, '([a-z]+)_([a-z]+)'.
 
     Returns:
-        - List[int]: A list of indexes corresponding to the records that were updated.
+        - pd.Series: The generated names, with the same index as the DataFrame.
 
     Notes:
-        - The function updates the 'industry' column of the DataFrame by concatenating multiple industries with a semicolon, including one before the first industry, eg
-         ;Meat;Milling.
-        - Although a different function that returns the indexes would make more sense from a modular approach, 
-         since this function is already going through the list where the indexes are saved, it's more efficient in this way.
+        - It follows the same rules as generate_name but works on whole columns instead of calling a function for every row.
+        - If only one of the first name and last name is missing, the other one is still used, eg "Zoe ".
+        - If the raw email is missing or doesn't match the pattern, an empty string is returned.
     """
-    indexes = []
-    for value in values:
-        index = value[0]
-        indexes.append(index)
-        industries = value[1]
-        if len(industries) > 1:
-            industries = ";" + ";".join(industries)
-            df.at[index, 'industry'] = industries
-    
-    return indexes
+    name_missing = (df['firstname'].isna() | (df['firstname'] == "")) & (df['lastname'].isna() | (df['lastname'] == ""))
+    full_name = df['firstname'].str.cat(df['lastname'], sep=" ", na_rep="")
+
+    email_name = df['raw_email'].str.extract(pattern, expand=True)
+    email_name = email_name.iloc[:, 0].str.capitalize() + " " + email_name.iloc[:, 1].str.capitalize()
+
+    names = np.where(name_missing, np.where(email_name.isna(), "", email_name), full_name)
+    return pd.Series(names, index=df.index)
 
 def duplicate_management(df: pd.DataFrame) -> pd.DataFrame: 
     """
@@ -266,44 +354,36 @@ def duplicate_management(df: pd.DataFrame) -> pd.DataFrame:
     Notes:
         - The criteria to define which one was the latest record was the 'createdAt' column, I chose this one only because of the example given, maybe another one like updatedAt 
          would be a better choice.
-        - The function iterates over the DataFrame and keeps track of the latest occurrence of each name (generating a name from the email if the name isn't present in the record).
-        - If a record with the same name is encountered again, the function updates missing values in the latest occurrence with values from the current record except for "industry".
-        - The 'industry' column is concatenated with a semicolon for multiple occurrences of the same name, with the latest record's industry listed first.
-        - The dictionary has a structure of  {email: [index,[industries]]}
-        - The function returns the DataFrame with only the latest records.
+        - The records are grouped by name (generating a name from the email if the name isn't present in the record), the ones without a name are dropped.
+        - Since the records are sorted from the latest to the oldest, the first non missing value of each column in a group is the one of the latest record that has it,
+         so the missing values of the latest record are updated with values from the older ones except for "industry".
+        - The 'industry' column is concatenated with a semicolon for multiple occurrences of the same name, with the latest record's industry listed last, eg ;Meat;Milling.
+         If there's a single industry but the latest record is missing it, the one of the latest record that has it is kept.
+        - The function returns the DataFrame with only the latest records, keeping their original indexes.
     """
     df['createdAt'] = pd.to_datetime(df['createdAt']) 
     df.sort_values(by=['createdAt'], ascending=False, inplace = True)
-    
-    first_records = {} 
 
-    for index, row in df.iterrows(): 
+    # The names are generated once and used as the key of the groups, on a copy so the column isn't added to the caller's DataFrame
+    df = df.assign(_name=generate_name_vectorized(df))
+    df = df[df['_name'] != ""]
 
-        name = generate_name(row)
-        if name == "":
-            continue
+    # Empty strings are treated as missing values so they can be updated with values from older records
+    grouped = df.mask(df == "").groupby('_name', sort=False)
+    latest = grouped.first()
 
-        if name not in first_records.keys():
-            first_records[name] = [index, [row['industry']]]            
-        else:
-            index_of_latest = first_records[name][0]
-            for column in df.columns:
-                if column == 'industry':
-                    continue 
-                if (pd.isnull(df.at[index_of_latest, column]) or df.at[index_of_latest, column] == "") and (pd.notnull(row[column]) and row[column] != "") :
-                        #Updates if the latest record has a missing value that an older one has
-                        df.loc[index_of_latest, column] = row[column] 
-
-            if row['industry'] not in first_records[name][1]:
-                first_records[name][1].insert(0, row['industry']) #Inserted at the start of the list according to the example
-
-    # Obtain indexes of the latest records and concatenate industries
-    indexes = concat_industries(df, first_records.values())
-    
-    # Filter the DataFrame based on the indexes of the latest records
-    df=df.loc[indexes, :]
+    # Unique industries of each contact from the oldest to the latest according to the example, the records are reversed after dropping the duplicates
+    # so the latest one is kept, and the ; is only added before the first one if there's more than one
+    industries = df.dropna(subset=['industry']).drop_duplicates(['_name', 'industry']).iloc[::-1]
+    grouped_industries = industries['industry'].astype(str).groupby(industries['_name'], sort=False)
+    concatenated = grouped_industries.agg(';'.join)
+    concatenated = concatenated.where(grouped_industries.size() == 1, ";" + concatenated)
+    latest['industry'] = concatenated.reindex(latest.index).astype('category')
 
-    return df
+    # The names are replaced by the original indexes of the latest records
+    latest.index = df.index[~df['_name'].duplicated()]
+
+    return latest
 
 
 #----------------------------------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,51 @@
+import requests
+import time
+from typing import Optional
+from requests.adapters import HTTPAdapter
+
+def create_session(pool_size: int = 32) -> requests.Session:
+    """
+    Description:
+        Create a requests session whose connections are reused across calls, so a new TCP and TLS connection isn't opened for every contact.
+
+    Arguments:
+        - pool_size: The number of connections kept open, it should be at least the number of threads using the session.
+
+    Returns:
+        - session: The session with the connection pool mounted for https.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    return session
+
+def post_with_retry(session: Optional[requests.Session], url: str, headers: dict, payload: dict, max_retries: int = 5) -> requests.Response:
+    """
+    Description:
+        Make a post request, waiting and retrying it while HubSpot answers that the rate limit was reached.
+
+    Arguments:
+        - session: The session used to make the request, if it's None a new connection is opened for the request with requests.post.
+        - url: String containing the url for the api call.
+        - headers: Dictionary containing the Authorization parameter for the call.
+        - payload: Dictionary with the body of the call, it's sent as json so requests sets the Content-Type.
+        - max_retries: The maximum number of times the request is made.
+
+    Returns:
+        - res: The response of the last request made.
+
+    Notes:
+        - The waiting time is taken from the Retry-After header of the response when it's a number of seconds, if it isn't, it doubles on every attempt.
+        - There's no waiting after the last attempt, the rate limited response is returned right away.
+    """
+    post = session.post if session is not None else requests.post
+    for attempt in range(max_retries):
+        res = post(url, headers=headers, json=payload)
+        if res.status_code != 429 or attempt == max_retries - 1:
+            break
+        try:
+            wait = float(res.headers.get('Retry-After', 2 ** attempt))
+        except ValueError: # Retry-After can also be an http date
+            wait = 2 ** attempt
+        time.sleep(wait)
+    return res